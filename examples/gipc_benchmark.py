@@ -26,6 +26,7 @@ import sys
 import logging
 import time
 import math
+import pickle
 
 import gevent
 sys.path.insert(0, os.path.abspath('..'))
@@ -61,28 +62,46 @@ def main():
     log.info("Determining N ...")
     benchmark_manager(msg, repetitions)
 
+    # Small message composed of primitive types, compare codecs.
+    msg = {"id": 12345, "name": "sensor-17", "values": [1.5, 2.5, 3.5]}
+    for codec in ('default', 'marshal', 'auto'):
+        log.info("Small message benchmark, codec: %s" % codec)
+        log.info("Determining N ...")
+        benchmark_manager(msg, repetitions, codec)
 
-def benchmark_manager(msg, repetitions):
+    # Batch of 1000 fixed-layout records: pickle vs. struct record codec.
+    gipc.register_codec('records', *gipc.record_codec(
+        'dqd', ('timestamp', 'sensor', 'value')))
+    msg = [(float(i), i, 0.5 * i) for i in range(1000)]
+    for codec in ('default', 'records'):
+        log.info("Record batch benchmark, codec: %s" % codec)
+        log.info("Determining N ...")
+        benchmark_manager(msg, repetitions, codec)
+
+
+def benchmark_manager(msg, repetitions, codec='default'):
     elapsed = 0
     N = 1
     # Find N so that benchmark lasts between 1 and two seconds
     while elapsed < 1:
         N *= 2
-        N, elapsed = benchmark(N, msg)
+        N, elapsed = benchmark(N, msg, codec)
 
     log.info("N = %s" % N)
     log.info("Running %s benchmarks ..." % repetitions)
     elapsed_values = []
     # Repeat benchmark, save statistics
     for _ in xrange(repetitions):
-        N, elapsed = benchmark(N, msg)
+        N, elapsed = benchmark(N, msg, codec)
         elapsed_values.append(elapsed)
         # Evaluate stats of single run
         mpertime = N/elapsed
-        datasize_mb = float(len(msg)*N)/1024/1024
+        # For non-string messages, this is the size of the pickled message.
+        msglen = len(msg) if isinstance(msg, str) else len(pickle.dumps(msg))
+        datasize_mb = float(msglen*N)/1024/1024
         datarate_mb = datasize_mb/elapsed
         log.info(" Single benchmark result:")
-        log.info("  --> N: %s, MSG length: %s" % (N, len(msg)))
+        log.info("  --> N: %s, MSG length: %s" % (N, msglen))
         log.info("  --> Read duration: %.3f s" % elapsed)
         log.info("  --> Average msg tx rate: %.3f msgs/s" % mpertime)
         log.info("  --> Payload transfer rate: %.3f MB/s" % datarate_mb)
@@ -104,35 +123,35 @@ def benchmark_manager(msg, repetitions):
         (datarate_mb_mean, datarate_mb_err))
 
 
-def benchmark(N, msg):
-    result = None
-    with gipc.pipe() as (syncr, syncw):
-        with gipc.pipe() as (reader, writer):
+def benchmark(N, msg, codec='default'):
+    # The synchronization messages are sent through a separate duplex pipe,
+    # so that the benchmarked pipe only carries messages of type `msg`.
+    with gipc.pipe(duplex=True) as (syncparent, syncchild):
+        with gipc.pipe(codec=codec) as (reader, writer):
             p = gipc.start_process(
                 writer_process,
                 kwargs={
                     'writer': writer,
-                    'syncr': syncr,
+                    'sync': syncchild,
                     'N': N,
                     'msg': msg})
              # Synchronize with child process
-            syncw.put("SYN")
-            assert reader.get() == "ACK"
+            syncparent.put("SYN")
+            assert syncparent.get() == "ACK"
             t = timer()
-            while result != 'stop':
-                result = reader.get()
+            for _ in xrange(N):
+                reader.get()
             elapsed = timer() - t
             p.join()
     return N, elapsed
 
 
-def writer_process(writer, syncr, N, msg):
+def writer_process(writer, sync, N, msg):
     with writer:
-        assert syncr.get() == "SYN"
-        writer.put("ACK")
+        assert sync.get() == "SYN"
+        sync.put("ACK")
         for i in xrange(N):
             writer.put(msg)
-        writer.put('stop')
 
 
 # Credit: http://stackoverflow.com/a/27758326/145400
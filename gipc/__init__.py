@@ -7,3 +7,6 @@ __version__ = "1.8.0"
 
 
 from .gipc import pipe, start_process, GIPCError, GIPCClosed, GIPCLocked
+from .gipc import register_codec, record_codec, relay
+from .shm import shm_pipe, SharedStore
+from .broadcast import Broadcaster
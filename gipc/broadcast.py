@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012-2021 Dr. Jan-Philip Gehrcke. See LICENSE file for details.
+
+
+"""
+Broadcasting messages to many pipes, encoding each message only once.
+"""
+
+
+import collections
+
+import gevent
+import gevent.queue
+
+from .gipc import GIPCError, _GIPCWriter, _GIPCDuplexHandle, _lookup_codec
+from .gipc import log
+from .shm import _ShmWriter
+
+
+# Queue item signaling a subscriber's greenlet to terminate.
+_STOP = object()
+
+
+class Broadcaster(object):
+    """
+    Publish messages to a set of subscribed write handles.
+
+    A message passed to :meth:`publish` is encoded once (once per distinct
+    encoder/compression configuration among the subscribers, to be precise),
+    and the resulting frame is written to all subscribers. Each subscriber is
+    served by a dedicated greenlet writing from a queue, so that a slow
+    subscriber (whose pipe is full) does not delay the others.
+
+    :arg writers:
+        Iterable of initial subscribers: :class:`gipc._GIPCWriter` or
+        :class:`gipc._GIPCDuplexHandle` instances.
+
+    :arg maxsize:
+        ``None`` (default) or the maximum number of messages queued per
+        subscriber.
+
+    :arg overflow:
+        What to do when publishing to a subscriber whose queue is full:
+        ``'block'`` (default) waits until there is space in the queue,
+        ``'drop'`` discards the message for this subscriber only (counted in
+        :attr:`dropped`). ``'drop'`` must not be used with stateful codecs.
+
+    A subscriber failing with an exception upon write (e.g. because the
+    other end of the pipe has been closed) is unsubscribed automatically. The
+    exception is stored in :attr:`failed`.
+
+    The broadcaster must only be used in the process that created it. Its
+    subscribers must not be transferred to other processes while subscribed.
+    Example::
+
+        with Broadcaster(writers) as b:
+            b.publish({"invalidate": key})
+    """
+    def __init__(self, writers=(), maxsize=None, overflow='block'):
+        if overflow not in ('block', 'drop'):
+            raise GIPCError(
+                "Broadcaster 'overflow' argument must be 'block' or 'drop'.")
+        self._maxsize = maxsize
+        self._overflow = overflow
+        # Map writer to (queue, greenlet).
+        self._subscribers = collections.OrderedDict()
+        #: Number of dropped messages per writer (``overflow='drop'``).
+        self.dropped = collections.Counter()
+        #: Exception per writer which has been unsubscribed due to failure.
+        self.failed = {}
+        for w in writers:
+            self.subscribe(w)
+
+    @property
+    def subscribers(self):
+        """List of currently subscribed writers."""
+        return list(self._subscribers)
+
+    def subscribe(self, writer):
+        """Add ``writer`` to the subscribers."""
+        if isinstance(writer, _GIPCDuplexHandle):
+            writer = writer._writer
+        if not isinstance(writer, _GIPCWriter) or isinstance(
+                writer, _ShmWriter):
+            raise GIPCError(
+                "Broadcaster subscribers must be pipe write handles.")
+        if writer in self._subscribers:
+            raise GIPCError("%s is subscribed already." % (writer, ))
+        if self._overflow == 'drop' and writer._encoder_name is not None:
+            if _lookup_codec(writer._encoder_name)[2]:
+                raise GIPCError(
+                    "overflow='drop' cannot be used with stateful codec %r." %
+                    (writer._encoder_name, ))
+        writer._validate()
+        q = gevent.queue.JoinableQueue(maxsize=self._maxsize)
+        g = gevent.spawn(self._serve, writer, q)
+        self._subscribers[writer] = (q, g)
+
+    def unsubscribe(self, writer):
+        """Remove ``writer`` from the subscribers. Block gevent-cooperatively
+        until the messages queued for ``writer`` have been written.
+        """
+        if isinstance(writer, _GIPCDuplexHandle):
+            writer = writer._writer
+        q, g = self._subscribers.pop(writer)
+        q.put(_STOP)
+        g.join()
+
+    def publish(self, o):
+        """Encode ``o`` and queue it for all subscribers. Return after the
+        message has been queued, before it has been written.
+
+        Raises:
+            - :exc:`GIPCError`
+            - :exc:`pickle.PicklingError` (or any other exception raised by
+              an encoder)
+        """
+        frames = {}
+        for writer, (q, g) in list(self._subscribers.items()):
+            # Writers configured identically produce identical frames.
+            key = (writer._encoder, writer._compression, writer._zerocopy)
+            frame = frames.get(key)
+            if frame is None:
+                frame = frames[key] = writer._frame(o)
+            if self._overflow == 'drop':
+                try:
+                    q.put_nowait(frame)
+                except gevent.queue.Full:
+                    self.dropped[writer] += 1
+            else:
+                q.put(frame)
+
+    def flush(self):
+        """Block gevent-cooperatively until all queued messages have been
+        written to the subscribers.
+        """
+        for q, g in list(self._subscribers.values()):
+            q.join()
+
+    def close(self):
+        """Write all queued messages and unsubscribe all writers. The writers
+        are not closed.
+        """
+        for writer in list(self._subscribers):
+            self.unsubscribe(writer)
+
+    def _serve(self, writer, q):
+        """Write frames from queue `q` to `writer` (runs in a greenlet)."""
+        while True:
+            frame = q.get()
+            try:
+                if frame is _STOP:
+                    return
+                writer._validate()
+                with writer._lock:
+                    for chunk in frame:
+                        writer._write(chunk)
+            except Exception as e:
+                log.debug("Unsubscribe %s after failure: %r", writer, e)
+                self.failed[writer] = e
+                self._subscribers.pop(writer, None)
+                # Unblock `flush()` and publishers waiting for queue space.
+                while True:
+                    q.task_done()
+                    try:
+                        q.get_nowait()
+                    except gevent.queue.Empty:
+                        return
+            else:
+                q.task_done()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<%s(%s subscribers)>" % (
+            self.__class__.__name__, len(self._subscribers))
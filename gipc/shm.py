@@ -0,0 +1,696 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012-2021 Dr. Jan-Philip Gehrcke. See LICENSE file for details.
+
+
+"""
+Shared memory-based message transport for gipc.
+
+:func:`shm_pipe` creates a unidirectional channel between a single writer and
+a single reader. Messages are exchanged through a ring buffer in a shared
+memory segment, avoiding one system call (and one copy through the kernel)
+per message and direction. A pipe is used only for waking up a reader which
+is blocked waiting for data.
+
+:class:`SharedStore` holds objects in a shared memory segment, so that an
+object published once can be read by many processes. Only small references
+need to be sent through pipes.
+"""
+
+
+import os
+import mmap
+import struct
+import tempfile
+import collections
+import multiprocessing.reduction
+
+import gevent
+import gevent.hub
+
+from .gipc import GIPCError, WINDOWS, FORK_MODE, pickle
+from .gipc import _GIPCReader, _GIPCWriter, _PairContext
+from .gipc import _validate_codec_args, _write_nonblocking
+
+
+# Layout of the shared memory segment. The header consists of 8-byte words:
+# the write position (head), the read position (tail), and the flag
+# signaling that the reader is about to block. They live on separate cache
+# lines, the constants are word indices. The ring buffer data region
+# follows. Head and tail are byte counters which only ever increase; the
+# writer exclusively writes the head, the reader exclusively writes the tail.
+# The header words are accessed through a memoryview of format 'Q', which
+# loads and stores each of them with a single memory access
+# (`struct.pack_into()` must not be used here: it zero-fills the target
+# before writing, so that the other process could observe a zero).
+_HEAD = 0
+_TAIL = 8
+_READER_WAITING = 16
+_DATA = 256
+
+# Every message occupies a (native, 4-byte) length word followed by the
+# payload, padded to a multiple of 4 bytes. The capacity is a multiple of 4,
+# too, so that the length word is never split by the ring boundary.
+_ALIGN = 4
+
+# Number of times the reader polls the ring buffer before preparing to block
+# (polling is much cheaper than a round trip through the event loop). On a
+# single CPU, the writer cannot make progress while the reader polls.
+_SPIN = 100 if (os.cpu_count() or 1) > 1 else 0
+
+# Upper bound for the time a blocked reader or writer waits before
+# re-checking the ring buffer (protects against missed wakeups, see
+# `_ShmReader._wait_for_data()`).
+_WAKEUP_INTERVAL = 0.01
+
+
+def shm_pipe(size=1 << 20, encoder='default', decoder='default', codec=None):
+    """Create a shared memory-based message transport channel and return two
+    corresponding handles for reading and writing data.
+
+    The handles provide the same ``put()``/``get()`` interface as the handles
+    returned by :func:`pipe` and can be transferred to a child process via
+    :func:`start_process` in the same way. Messages are written to a ring
+    buffer in shared memory. The underlying pipe is only used to wake up the
+    reader if it is blocked waiting for a message. This provides lower
+    latency and a higher message rate than :func:`pipe`, in particular for
+    small messages.
+
+    There must be only a single reader and a single writer, i.e. each handle
+    must be used in only one process at a time (as for any gipc handle).
+
+    :arg size:
+        Capacity of the ring buffer in bytes (default: 1 MiB). Each message
+        occupies its encoded size plus 4 to 7 bytes. ``put()`` blocks while
+        the ring buffer is too full for the message and raises
+        :exc:`GIPCError` if the message can never fit.
+
+    :arg encoder:
+        Same as for :func:`pipe`.
+
+    :arg decoder:
+        Same as for :func:`pipe`.
+
+    :arg codec:
+        Same as for :func:`pipe`.
+
+    :returns: ``(reader, writer)`` 2-tuple, usable as context manager.
+
+    Not available on Windows. Example::
+
+        with shm_pipe() as (r, w):
+            p = start_process(target=consumer, args=(r, ))
+            for quote in quotes:
+                w.put(quote)
+    """
+    if WINDOWS:
+        raise GIPCError("shm_pipe() is not supported on Windows.")
+    encoder, decoder = _validate_codec_args(encoder, decoder, codec)
+    capacity = -(-size // _ALIGN) * _ALIGN
+    if capacity < 2 * _ALIGN:
+        raise GIPCError("shm_pipe 'size' argument is too small.")
+
+    shm_fd = _create_segment(_DATA + capacity)
+    try:
+        r, w = os.pipe()
+        # Each handle owns a file descriptor referring to the segment, which
+        # is needed for transferring the handle to a spawned child.
+        reader = _ShmReader(r, os.dup(shm_fd), capacity, decoder)
+        writer = _ShmWriter(w, os.dup(shm_fd), capacity, encoder)
+    finally:
+        os.close(shm_fd)
+    return _PairContext((reader, writer))
+
+
+def _create_segment(size):
+    """Create an anonymous shared memory segment of `size` bytes and return a
+    file descriptor referring to it. The segment is released by the system
+    once all file descriptors and mappings referring to it are gone.
+    """
+    if hasattr(os, 'memfd_create'):
+        fd = os.memfd_create("gipc-shm")
+    else:
+        # Use a file which is unlinked right away. Prefer a memory-backed
+        # file system.
+        tmpdir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        fd, path = tempfile.mkstemp(prefix="gipc-shm-", dir=tmpdir)
+        os.unlink(path)
+    try:
+        os.ftruncate(fd, size)
+    except OSError:
+        os.close(fd)
+        raise
+    return fd
+
+
+class _ShmHandleMixin(object):
+    """
+    Manage the mapping of the shared memory segment for a shared memory
+    handle. Its lifetime is bound to the lifetime of the handle.
+    """
+    def _map(self, shm_fd, capacity):
+        self._shm_fd = shm_fd
+        self._capacity = capacity
+        self._mmap = mmap.mmap(shm_fd, _DATA + capacity)
+        self._buf = memoryview(self._mmap)
+        # Header words, see `_HEAD` etc.
+        self._words = self._buf[:_DATA].cast('Q')
+        # Data region as 4-byte words, for accessing length words.
+        self._lens = self._buf[_DATA:].cast('I')
+
+    def close(self):
+        super(_ShmHandleMixin, self).close()
+        self._words.release()
+        self._lens.release()
+        self._buf.release()
+        self._mmap.close()
+        os.close(self._shm_fd)
+
+
+class _ShmReader(_ShmHandleMixin, _GIPCReader):
+    """
+    A ``_ShmReader`` instance manages the read end of a shared memory
+    channel. It is created via :func:`shm_pipe`.
+    """
+    _framed = False
+
+    def __init__(self, pipe_read_fd, shm_fd, capacity, decoder):
+        self._map(shm_fd, capacity)
+        _GIPCReader.__init__(self, pipe_read_fd, decoder)
+        self._tail = self._words[_TAIL]
+        # Last known position of the writer.
+        self._head = self._tail
+
+    def _wait_for_data(self):
+        """Wait gevent-cooperatively until the ring buffer is not empty and
+        return the position of the writer.
+        """
+        words = self._words
+        for _ in range(_SPIN):
+            head = words[_HEAD]
+            if head != self._tail:
+                return head
+
+        hub = gevent.get_hub()
+        io = hub.loop.io(self._fd, 1)
+        timer = hub.loop.timer(_WAKEUP_INTERVAL)
+        try:
+            return self._wait_for_wakeup(hub, io, timer)
+        finally:
+            io.close()
+            timer.close()
+
+    def _wait_for_wakeup(self, hub, io, timer):
+        words = self._words
+        while True:
+            # Announce that the reader is about to block, then re-check. A
+            # message published before the writer could see the flag is not
+            # missed this way. The flag and the positions are not accessed
+            # with memory barriers, so a wakeup may still get lost in rare
+            # cases: re-check periodically instead of waiting indefinitely.
+            words[_READER_WAITING] = 1
+            head = words[_HEAD]
+            if head != self._tail:
+                words[_READER_WAITING] = 0
+                return head
+            # Wait for the pipe to become readable, or for the timer to
+            # expire. Raw watchers are considerably cheaper than a
+            # `gevent.Timeout` here.
+            waiter = gevent.hub.Waiter()
+            io.start(waiter.switch, None)
+            timer.start(waiter.switch, None)
+            try:
+                waiter.get()
+            finally:
+                io.stop()
+                timer.stop()
+            try:
+                # Consume all pending wakeups.
+                eof = not os.read(self._fd, 4096)
+            except BlockingIOError:
+                eof = False
+            if eof:
+                # All write ends of the wakeup pipe are closed.
+                head = words[_HEAD]
+                if head == self._tail:
+                    raise EOFError(
+                        "Most likely, the other pipe end is closed.")
+
+    def get(self, timeout=None):
+        """Receive, decode and return data from the ring buffer. Block
+        gevent-cooperatively until data is available or timeout expires.
+
+        Same as :meth:`gipc._GIPCReader.get`.
+        """
+        return self._decoder(self.get_raw(timeout))
+
+    def get_raw(self, timeout=None):
+        """Same as :meth:`gipc._GIPCReader.get_raw`."""
+        self._validate()
+        with self._lock:
+            if self._head == self._tail:
+                self._head = self._wait_for_data()
+            if timeout:
+                timeout.cancel()
+            buf = self._buf
+            cap = self._capacity
+            offset = self._tail % cap
+            n = self._lens[offset // _ALIGN]
+            start = (offset + _ALIGN) % cap
+            end = start + n
+            if end <= cap:
+                bindata = buf[_DATA + start:_DATA + end].tobytes()
+            else:
+                bindata = b"".join((
+                    buf[_DATA + start:_DATA + cap],
+                    buf[_DATA:_DATA + end - cap]))
+            # Release the space only after the message has been copied.
+            self._tail += _ALIGN + -(-n // _ALIGN) * _ALIGN
+            self._words[_TAIL] = self._tail
+        return bindata
+
+
+class _ShmWriter(_ShmHandleMixin, _GIPCWriter):
+    """
+    A ``_ShmWriter`` instance manages the write end of a shared memory
+    channel. It is created via :func:`shm_pipe`.
+    """
+    _framed = False
+
+    def __init__(self, pipe_write_fd, shm_fd, capacity, encoder):
+        self._map(shm_fd, capacity)
+        _GIPCWriter.__init__(self, pipe_write_fd, encoder)
+        self._head = self._words[_HEAD]
+        # Last known position of the reader.
+        self._tail = self._words[_TAIL]
+
+    def _wait_for_space(self, tail):
+        """Wait gevent-cooperatively until the reader has advanced to (at
+        least) position `tail`.
+        """
+        delay = 0.00001
+        while True:
+            self._tail = self._words[_TAIL]
+            if self._tail >= tail:
+                return
+            gevent.sleep(delay)
+            delay = min(2 * delay, _WAKEUP_INTERVAL)
+            if delay == _WAKEUP_INTERVAL:
+                # Wake up the reader in case it missed a wakeup. Raises an
+                # `OSError` (broken pipe) if the read end is closed.
+                _write_nonblocking(self._fd, b"\0")
+
+    def put(self, o):
+        """Encode object ``o`` and write it to the ring buffer. Block
+        gevent-cooperatively until there is enough space in the ring buffer.
+
+        Same as :meth:`gipc._GIPCWriter.put`.
+        """
+        self._validate()
+        with self._lock:
+            self._put_encoded(self._encoder(o))
+
+    def put_raw(self, bindata):
+        """Same as :meth:`gipc._GIPCWriter.put_raw`."""
+        self._validate()
+        with self._lock:
+            self._put_encoded(bindata)
+
+    def _put_encoded(self, bindata):
+        """Write the encoded message `bindata` to the ring buffer. Must be
+        called with the lock held.
+        """
+        n = len(bindata)
+        size = _ALIGN + -(-n // _ALIGN) * _ALIGN
+        cap = self._capacity
+        if size > cap:
+            raise GIPCError(
+                "Message of size %s exceeds shared memory capacity %s." % (
+                    n, cap))
+        head = self._head
+        if head + size - self._tail > cap:
+            self._wait_for_space(head + size - cap)
+        buf = self._buf
+        offset = head % cap
+        self._lens[offset // _ALIGN] = n
+        start = (offset + _ALIGN) % cap
+        end = start + n
+        if end <= cap:
+            buf[_DATA + start:_DATA + end] = bindata
+        else:
+            bindata = memoryview(bindata)
+            buf[_DATA + start:_DATA + cap] = bindata[:cap - start]
+            buf[_DATA:_DATA + end - cap] = bindata[cap - start:]
+        # Publish the message.
+        self._head = head + size
+        words = self._words
+        words[_HEAD] = self._head
+        if words[_READER_WAITING]:
+            words[_READER_WAITING] = 0
+            _write_nonblocking(self._fd, b"\0")
+
+
+# Layout of the `SharedStore` segment: a header of 8-byte words (the
+# generation counter, followed by the entry table), then the data region.
+# Each entry in the table consists of four words: generation (0 for a free
+# slot), offset and size of the data, and reference count.
+_STORE_GENERATION = 0
+_STORE_TABLE = 8
+_STORE_ENTRY_WORDS = 4
+_STORE_ENTRY_GEN, _STORE_ENTRY_OFFSET, _STORE_ENTRY_SIZE, _STORE_ENTRY_REFS = (
+    0, 1, 2, 3)
+
+# Alignment of the out-of-band buffers (e.g. NumPy array data) in the data
+# region.
+_STORE_ALIGN = 64
+
+# Reference to an object in a `SharedStore`. Small and picklable, i.e. it
+# can be sent through any pipe.
+_SharedRef = collections.namedtuple('_SharedRef', 'slot generation size')
+
+
+class SharedStore(object):
+    """
+    Shared memory-based store for large read-only objects which need to be
+    accessed by multiple processes.
+
+    The process creating the store (the publisher) places an object into the
+    store once via :meth:`put`, and obtains a small reference. References can
+    be sent through any pipe. Any process having the store (pass it to
+    :func:`start_process` like a handle) obtains the object via
+    :meth:`get`. Objects are serialized with pickle (protocol 5). Large
+    buffers contained in an object, such as the data of NumPy arrays, are not
+    copied upon :meth:`get`: the resulting object refers to the shared
+    memory directly (read-only). That is, each process saves the memory for
+    its own copy.
+
+    Entries are reference counted. The publisher holds a reference to each
+    entry it creates via :meth:`put`. In any other process, the first
+    :meth:`get` for a reference acquires a reference for that process. A
+    reference is held until :meth:`release` is called (or the store is
+    closed) in the process holding it.
+    Entries whose reference count dropped to zero are evicted (oldest first)
+    when space is needed for a new entry. Until then, they remain available.
+
+    :arg size:
+        Capacity of the data region in bytes (default: 64 MiB).
+
+    :arg max_entries:
+        Maximum number of entries in the store (default: 1024).
+
+    Not available on Windows. Example::
+
+        with SharedStore(size=2**30) as store:
+            ref = store.put(lookup_table)
+            p = start_process(worker, args=(store, r))
+            w.put(ref)
+            ...
+
+        def worker(store, r):
+            lookup_table = store.get(r.get())
+    """
+    def __init__(self, size=64 * 1024 * 1024, max_entries=1024):
+        if WINDOWS:
+            raise GIPCError("SharedStore is not supported on Windows.")
+        if size < 1 or max_entries < 1:
+            raise GIPCError(
+                "SharedStore 'size' and 'max_entries' must be positive.")
+        header = 8 * (_STORE_TABLE + _STORE_ENTRY_WORDS * max_entries)
+        data_offset = -(-header // _STORE_ALIGN) * _STORE_ALIGN
+        fd = _create_segment(data_offset + size)
+        ctx = multiprocessing.get_context(FORK_MODE)
+        self._setup(fd, size, max_entries, ctx.Lock(), os.getpid())
+
+    def _setup(self, fd, size, max_entries, lock, publisher_pid):
+        self._fd = fd
+        self._size = size
+        self._max_entries = max_entries
+        header = 8 * (_STORE_TABLE + _STORE_ENTRY_WORDS * max_entries)
+        self._data_offset = -(-header // _STORE_ALIGN) * _STORE_ALIGN
+        self._mmap = mmap.mmap(fd, self._data_offset + size)
+        self._buf = memoryview(self._mmap)
+        self._words = self._buf[:header].cast('Q')
+        # Protects the entry table (reference counts in particular) across
+        # processes. Only held for short critical sections.
+        self._lock = lock
+        self._publisher_pid = publisher_pid
+        self._closed = False
+        self._reset_process_state()
+
+    def _reset_process_state(self):
+        # Objects obtained via `get()` in the current process, keyed by
+        # reference. Each of them holds a reference count in the store.
+        self._held = {}
+        self._pid = os.getpid()
+
+    def _check(self):
+        if self._closed:
+            raise GIPCError("SharedStore has been closed before.")
+        if self._pid != os.getpid():
+            # The store has been inherited by a forked child process. The
+            # references held by the parent are not held by the child.
+            self._reset_process_state()
+
+    def _entry(self, slot):
+        return _STORE_TABLE + _STORE_ENTRY_WORDS * slot
+
+    def put(self, o):
+        """Serialize object ``o`` into the store and return a reference to
+        it. The calling process holds this reference until :meth:`release`
+        is called; :meth:`get` returns ``o`` itself in this process. Must
+        only be called in the process that created the store.
+
+        Raises:
+            - :exc:`GIPCError` if there is not enough space (after evicting
+              all unreferenced entries).
+        """
+        self._check()
+        if os.getpid() != self._publisher_pid:
+            raise GIPCError(
+                "SharedStore.put() must be called in the process that "
+                "created the store.")
+        buffers = []
+        data = pickle.dumps(o, protocol=5, buffer_callback=buffers.append)
+        raws = [b.raw() for b in buffers]
+        # Entry layout: number of buffers, length of the pickle data, and
+        # buffer lengths, followed by the pickle data, followed by the
+        # aligned buffers.
+        header = struct.pack(
+            "=QQ%dQ" % len(raws), len(raws), len(data),
+            *[r.nbytes for r in raws])
+        size = len(header) + len(data)
+        for r in raws:
+            size = -(-size // _STORE_ALIGN) * _STORE_ALIGN + r.nbytes
+
+        with self._lock:
+            slot, offset = self._allocate(size)
+            start = self._data_offset + offset
+            pos = start + len(header)
+            self._buf[start:pos] = header
+            self._buf[pos:pos + len(data)] = data
+            pos += len(data)
+            for r in raws:
+                pos = start + -(-(pos - start) // _STORE_ALIGN) * _STORE_ALIGN
+                self._buf[pos:pos + r.nbytes] = r
+                pos += r.nbytes
+            generation = self._words[_STORE_GENERATION] + 1
+            self._words[_STORE_GENERATION] = generation
+            e = self._entry(slot)
+            self._words[e + _STORE_ENTRY_OFFSET] = offset
+            self._words[e + _STORE_ENTRY_SIZE] = size
+            self._words[e + _STORE_ENTRY_REFS] = 1
+            self._words[e + _STORE_ENTRY_GEN] = generation
+        ref = _SharedRef(slot, generation, size)
+        self._held[ref] = o
+        return ref
+
+    def _allocate(self, size):
+        """Find a free slot and a free region of `size` bytes in the data
+        region, evicting unreferenced entries if required. Return the slot
+        and the offset of the region. Must be called with the lock held.
+        """
+        if size > self._size:
+            raise GIPCError(
+                "Object of size %s exceeds SharedStore capacity %s." % (
+                    size, self._size))
+        live = []
+        for slot in range(self._max_entries):
+            e = self._entry(slot)
+            generation = self._words[e + _STORE_ENTRY_GEN]
+            if generation:
+                live.append((
+                    generation, slot, self._words[e + _STORE_ENTRY_OFFSET],
+                    self._words[e + _STORE_ENTRY_SIZE],
+                    self._words[e + _STORE_ENTRY_REFS]))
+        # Evict unreferenced entries, oldest first, until the object fits.
+        evictable = sorted(x for x in live if x[4] == 0)
+        live = set(live)
+        while True:
+            slot = self._free_slot(live)
+            offset = self._free_region(live, size)
+            if slot is not None and offset is not None:
+                break
+            if not evictable:
+                raise GIPCError(
+                    "SharedStore is full: no space for object of size %s." % (
+                        size, ))
+            victim = evictable.pop(0)
+            live.remove(victim)
+            self._words[self._entry(victim[1]) + _STORE_ENTRY_GEN] = 0
+        return slot, offset
+
+    def _free_slot(self, live):
+        used = set(x[1] for x in live)
+        for slot in range(self._max_entries):
+            if slot not in used:
+                return slot
+        return None
+
+    def _free_region(self, live, size):
+        # First fit.
+        pos = 0
+        for offset, length in sorted((x[2], x[3]) for x in live):
+            if offset - pos >= size:
+                return pos
+            pos = -(-(offset + length) // _STORE_ALIGN) * _STORE_ALIGN
+        if self._size - pos >= size:
+            return pos
+        return None
+
+    def get(self, ref):
+        """Return the object referred to by ``ref``. The object is decoded
+        upon first access in the current process, subsequent calls return the
+        same object. Buffers within the object (for instance, the data of
+        NumPy arrays) are read-only views of the shared memory.
+
+        Raises:
+            - :exc:`KeyError` if the entry has been evicted before it was
+              accessed by the current process.
+        """
+        self._check()
+        if ref in self._held:
+            return self._held[ref]
+        e = self._entry(ref.slot)
+        with self._lock:
+            if self._words[e + _STORE_ENTRY_GEN] != ref.generation:
+                raise KeyError(ref)
+            self._words[e + _STORE_ENTRY_REFS] += 1
+            offset = self._words[e + _STORE_ENTRY_OFFSET]
+        try:
+            o = self._decode(self._data_offset + offset)
+        except BaseException:
+            self._decref(ref)
+            raise
+        self._held[ref] = o
+        return o
+
+    def _decode(self, start):
+        buf = self._buf
+        nbuffers, datalen = struct.unpack_from("=QQ", buf, start)
+        lengths = struct.unpack_from("=%dQ" % nbuffers, buf, start + 16)
+        pos = start + 16 + 8 * nbuffers
+        data = buf[pos:pos + datalen]
+        pos += datalen
+        buffers = []
+        for length in lengths:
+            pos = start + -(-(pos - start) // _STORE_ALIGN) * _STORE_ALIGN
+            buffers.append(buf[pos:pos + length].toreadonly())
+            pos += length
+        return pickle.loads(data, buffers=buffers)
+
+    def _decref(self, ref):
+        e = self._entry(ref.slot)
+        with self._lock:
+            if self._words[e + _STORE_ENTRY_GEN] == ref.generation:
+                self._words[e + _STORE_ENTRY_REFS] -= 1
+
+    def release(self, ref):
+        """Release the reference to ``ref`` held by the current process (if
+        any), and drop the object obtained via :meth:`get` (or passed to
+        :meth:`put`). The object must not be used anymore by the current
+        process if it contains buffers referring to the shared memory.
+        """
+        self._check()
+        if ref in self._held:
+            del self._held[ref]
+            self._decref(ref)
+
+    def refcount(self, ref):
+        """Return the number of references held to ``ref`` across processes,
+        or ``0`` if the entry has been evicted.
+        """
+        self._check()
+        e = self._entry(ref.slot)
+        with self._lock:
+            if self._words[e + _STORE_ENTRY_GEN] != ref.generation:
+                return 0
+            return self._words[e + _STORE_ENTRY_REFS]
+
+    def close(self):
+        """Release all references held by the current process and unmap the
+        store in the current process.
+        """
+        if self._closed:
+            return
+        self._check()
+        for ref in list(self._held):
+            self.release(ref)
+        self._closed = True
+        self._words.release()
+        self._buf.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Objects obtained via `get()` are still referring to the
+            # mapping. It is unmapped when they are gone.
+            pass
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<%s(size=%s, max_entries=%s)>" % (
+            self.__class__.__name__, self._size, self._max_entries)
+
+
+if not WINDOWS and FORK_MODE == 'spawn':
+    # See the corresponding code for `_GIPCReader` and `_GIPCWriter`. The
+    # segment is transferred via file descriptor, too.
+
+    def reduce_ShmReader(reader):
+        df = multiprocessing.reduction.DupFd(reader._fd)
+        shm_df = multiprocessing.reduction.DupFd(reader._shm_fd)
+        decoder = reader._decoder_name or reader._decoder
+        return (rebuild_ShmReader, (df, shm_df, reader._capacity, decoder))
+
+    def rebuild_ShmReader(df, shm_df, capacity, decoder):
+        return _ShmReader(df.detach(), shm_df.detach(), capacity, decoder)
+
+    multiprocessing.reduction.register(_ShmReader, reduce_ShmReader)
+
+    def reduce_ShmWriter(writer):
+        df = multiprocessing.reduction.DupFd(writer._fd)
+        shm_df = multiprocessing.reduction.DupFd(writer._shm_fd)
+        encoder = writer._encoder_name or writer._encoder
+        return (rebuild_ShmWriter, (df, shm_df, writer._capacity, encoder))
+
+    def rebuild_ShmWriter(df, shm_df, capacity, encoder):
+        return _ShmWriter(df.detach(), shm_df.detach(), capacity, encoder)
+
+    multiprocessing.reduction.register(_ShmWriter, reduce_ShmWriter)
+
+    def reduce_SharedStore(store):
+        df = multiprocessing.reduction.DupFd(store._fd)
+        return (rebuild_SharedStore, (
+            df, store._size, store._max_entries, store._lock,
+            store._publisher_pid))
+
+    def rebuild_SharedStore(df, size, max_entries, lock, publisher_pid):
+        store = SharedStore.__new__(SharedStore)
+        store._setup(df.detach(), size, max_entries, lock, publisher_pid)
+        return store
+
+    multiprocessing.reduction.register(SharedStore, reduce_SharedStore)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012-2021 Dr. Jan-Philip Gehrcke. See LICENSE file for details.
+
+
+"""
+Tests for `gipc.Broadcaster`.
+"""
+
+
+import os
+import sys
+
+import gevent
+
+sys.path.insert(0, os.path.abspath('..'))
+from gipc import start_process, pipe, shm_pipe, Broadcaster, GIPCError
+
+from pytest import raises
+
+from test_gipc import check_for_handles_left_open
+
+
+SHORTTIME = 0.01
+
+
+class TestBroadcaster(object):
+    def setup(self):
+        self.pipes = [pipe() for _ in range(5)]
+        self.readers = [r for r, _ in self.pipes]
+        self.writers = [w for _, w in self.pipes]
+
+    def teardown(self):
+        for r, w in self.pipes:
+            for h in (r, w):
+                if not h._closed:
+                    h.close()
+        check_for_handles_left_open()
+
+    def test_publish(self):
+        with Broadcaster(self.writers) as b:
+            assert b.subscribers == self.writers
+            b.publish({"a": 1})
+            b.publish("second")
+        for r in self.readers:
+            assert r.get() == {"a": 1}
+            assert r.get() == "second"
+
+    def test_encodes_once(self):
+        calls = []
+
+        def enc(o):
+            calls.append(o)
+            return o
+
+        with pipe(encoder=enc, decoder=None) as (r1, w1):
+            with pipe(encoder=enc, decoder=None) as (r2, w2):
+                with Broadcaster([w1, w2]) as b:
+                    b.publish(b"x")
+                assert r1.get() == r2.get() == b"x"
+        assert calls == [b"x"]
+
+    def test_distinct_configurations(self):
+        with pipe(compression='zlib', compression_threshold=0) as (r, w):
+            with Broadcaster([w, self.writers[0]]) as b:
+                b.publish("x" * 1000)
+            assert r.get() == "x" * 1000
+            assert self.readers[0].get() == "x" * 1000
+
+    def test_slow_subscriber_does_not_block(self):
+        # Fill the pipe of the first subscriber, nobody reads from it.
+        m = "x" * 100000
+        with Broadcaster(self.writers) as b:
+            b.publish(m)
+            gevent.sleep(SHORTTIME)
+            for r in self.readers[1:]:
+                assert r.get() == m
+            b.publish("next")
+            for r in self.readers[1:]:
+                assert r.get() == "next"
+            # Drain the slow subscriber, so that close() can complete.
+            assert self.readers[0].get() == m
+            assert self.readers[0].get() == "next"
+
+    def test_drop(self):
+        m = "x" * 100000
+        with Broadcaster(self.writers[:1], maxsize=1, overflow='drop') as b:
+            for _ in range(5):
+                b.publish(m)
+            assert b.dropped[self.writers[0]] > 0
+            n = 5 - b.dropped[self.writers[0]]
+            for _ in range(n):
+                assert self.readers[0].get() == m
+
+    def test_subscribe_unsubscribe(self):
+        b = Broadcaster()
+        b.subscribe(self.writers[0])
+        with raises(GIPCError):
+            b.subscribe(self.writers[0])
+        b.publish(1)
+        b.unsubscribe(self.writers[0])
+        assert b.subscribers == []
+        b.publish(2)
+        assert self.readers[0].get() == 1
+        b.close()
+
+    def test_duplex_handle(self):
+        with pipe(duplex=True) as (h1, h2):
+            with Broadcaster([h1]) as b:
+                b.publish("foo")
+            assert h2.get() == "foo"
+
+    def test_invalid_subscribers(self):
+        with raises(GIPCError):
+            Broadcaster([self.readers[0]])
+        with shm_pipe() as (r, w):
+            with raises(GIPCError):
+                Broadcaster([w])
+
+    def test_drop_with_stateful_codec(self):
+        with pipe(codec='session') as (r, w):
+            with raises(GIPCError):
+                Broadcaster([w], overflow='drop')
+
+    def test_failed_subscriber_is_removed(self):
+        self.readers[0].close()
+        with Broadcaster(self.writers) as b:
+            b.publish("foo")
+            b.flush()
+            assert self.writers[0] not in b.subscribers
+            assert isinstance(b.failed[self.writers[0]], OSError)
+        for r in self.readers[1:]:
+            assert r.get() == "foo"
+
+    def test_children(self):
+        for r in self.readers:
+            r.close()
+        pipes = [pipe() for _ in range(3)]
+        procs = [start_process(bc_readchild, args=(r, )) for r, _ in pipes]
+        with Broadcaster([w for _, w in pipes]) as b:
+            for i in range(100):
+                b.publish(i)
+        for _, w in pipes:
+            w.close()
+        for p in procs:
+            p.join()
+            assert p.exitcode == 0
+
+
+def bc_readchild(r):
+    for i in range(100):
+        assert r.get() == i
@@ -14,15 +14,24 @@ import os
 import sys
 import time
 import signal
+import json
+import array
+import struct
+import pickle
+import marshal
 import random
 import logging
+import collections
 import multiprocessing
 
 import gevent
 import gevent.queue
 
 sys.path.insert(0, os.path.abspath('..'))
+import gipc.gipc
 from gipc import start_process, pipe, GIPCError, GIPCClosed, GIPCLocked
+from gipc import register_codec, record_codec, relay, shm_pipe
+from gipc.gipc import _GIPCReader, _GIPCWriter
 from gipc.gipc import _get_all_handles as get_all_handles
 from gipc.gipc import _set_all_handles as set_all_handles
 from gipc.gipc import _signals_to_reset as signals_to_reset
@@ -1064,6 +1073,652 @@ def child_test_raw_pipe_across_processes(r):
     assert r.get() == b'abc'
 
 
+# Named codecs are registered on module level so that they are registered
+# in children, too, regardless of the process creation method.
+register_codec(
+    'test-json',
+    lambda o: json.dumps(o).encode("ascii"),
+    lambda b: json.loads(b.decode("ascii")))
+
+
+class TestCodecRegistry(object):
+    """Test named codecs registered via `register_codec()`.
+    """
+    def teardown(self):
+        check_for_handles_left_open()
+
+    def test_codec_name(self):
+        data = {"a": [1, 2]}
+        with pipe(codec='test-json') as (r, w):
+            w.put(data)
+            assert r.get() == data
+            assert w._encoder_name == r._decoder_name == 'test-json'
+
+    def test_encoder_decoder_names(self):
+        data = {"a": [1, 2]}
+        with pipe(encoder='test-json', decoder=None) as (r, w):
+            w.put(data)
+            assert r.get() == json.dumps(data).encode("ascii")
+
+    def test_default_is_named(self):
+        with pipe() as (r, w):
+            assert w._encoder_name == r._decoder_name == 'default'
+
+    def test_unknown_codec(self):
+        with raises(GIPCError):
+            pipe(codec='does-not-exist')
+        with raises(GIPCError):
+            pipe(encoder='does-not-exist')
+
+    def test_codec_and_encoder(self):
+        with raises(GIPCError):
+            pipe(codec='test-json', encoder=lambda x: x)
+
+    def test_register_not_callable(self):
+        with raises(GIPCError):
+            register_codec('foo', 1, lambda x: x)
+
+    def test_handle_state_carries_name(self):
+        with pipe(codec='test-json') as (r, w):
+            wstate = w.__getstate__()
+            rstate = r.__getstate__()
+            assert '_encoder' not in wstate
+            assert '_decoder' not in rstate
+            # Make sure that the state can be pickled (i.e. does not contain
+            # the lambda functions).
+            pickle.dumps(wstate)
+            pickle.dumps(rstate)
+            w2 = _GIPCWriter.__new__(_GIPCWriter)
+            w2.__setstate__(wstate)
+            r2 = _GIPCReader.__new__(_GIPCReader)
+            r2.__setstate__(rstate)
+            assert w2._encoder is w._encoder
+            assert r2._decoder is r._decoder
+
+    def test_across_processes(self):
+        m = {"KLADUSCH": "foo"}
+        with pipe(codec='test-json') as (r, w):
+            p = start_process(ipc_readchild, args=(r, m))
+            w.put(m)
+            p.join()
+            assert p.exitcode == 0
+
+
+class CustomType(object):
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class TestBuiltinCodecs(object):
+    """Test the built-in 'marshal' and 'auto' codecs.
+    """
+    PRIMITIVES = [
+        None, True, 1, 2**100, 1.5, "ä", b"x", (1, "a"), [1, [2]],
+        {"a": {"b": [1.0, None]}}, set([1, 2]), frozenset([3])]
+
+    def teardown(self):
+        check_for_handles_left_open()
+
+    def test_marshal(self):
+        with pipe(codec='marshal') as (r, w):
+            for m in self.PRIMITIVES:
+                w.put(m)
+                assert r.get() == m
+
+    def test_marshal_unsupported_type(self):
+        with pipe(codec='marshal') as (r, w):
+            with raises(ValueError):
+                w.put(CustomType(1))
+
+    def test_auto(self):
+        messages = self.PRIMITIVES + [
+            CustomType(1), {"a": CustomType(2)}, Exception]
+        with pipe(codec='auto') as (r, w):
+            for m in messages:
+                gw = gevent.spawn(w.put, m)
+                assert r.get() == m
+                gw.get()
+
+    def test_auto_uses_marshal_for_primitives(self):
+        with pipe(encoder='auto', decoder=None) as (r, w):
+            w.put({"a": 1})
+            assert r.get() == marshal.dumps({"a": 1}, 2)
+            w.put(CustomType(1))
+            assert r.get()[:1] == b'\x80'
+
+    def test_auto_subclass_falls_back_to_pickle(self):
+        m = collections.OrderedDict([("b", 1), ("a", 2)])
+        with pipe(codec='auto') as (r, w):
+            w.put(m)
+            result = r.get()
+            assert type(result) is collections.OrderedDict
+            assert result == m
+
+    def test_auto_recursive_falls_back_to_pickle(self):
+        m = [1]
+        m.append(m)
+        with pipe(codec='auto') as (r, w):
+            w.put(m)
+            result = r.get()
+            assert result[1] is result
+
+    def test_auto_decodes_pickle(self):
+        with pipe(encoder='default', decoder='auto') as (r, w):
+            w.put({"a": 1})
+            assert r.get() == {"a": 1}
+
+    def test_auto_across_processes(self):
+        m = {"KLADUSCH": ["foo", 1, 2.0]}
+        with pipe(codec='auto') as (r, w):
+            p = start_process(ipc_readchild, args=(r, m))
+            w.put(m)
+            p.join()
+            assert p.exitcode == 0
+
+
+class TestSessionCodec(object):
+    """Test the stateful 'session' codec.
+    """
+    def teardown(self):
+        check_for_handles_left_open()
+
+    def test_roundtrip(self):
+        messages = [
+            [CustomType("a"), CustomType("b")],
+            {"key": CustomType(1), "other": "key"},
+            [CustomType(i) for i in range(100)],
+            collections.OrderedDict(key=1),
+            "x" * 1000,
+            ]
+        with pipe(codec='session') as (r, w):
+            for m in messages * 2:
+                w.put(m)
+                assert r.get() == m
+
+    def test_repeated_message_shrinks(self):
+        m = [CustomType("value"), {"somekey": 1}]
+        with pipe(encoder='session', decoder=None) as (r, w):
+            w.put(m)
+            first = r.get()
+            w.put(m)
+            second = r.get()
+        assert len(second) < len(first)
+        assert len(second) < len(pickle.dumps(m, pickle.HIGHEST_PROTOCOL))
+
+    def test_state_per_pipe(self):
+        m = [CustomType("value")]
+        with pipe(codec='session') as (r1, w1):
+            with pipe(codec='session') as (r2, w2):
+                assert w1._encoder is not w2._encoder
+                w1.put(m)
+                assert r1.get() == m
+                # Second pipe must define IDs from scratch.
+                w2.put(m)
+                assert r2.get() == m
+
+    def test_mutated_object_is_sent_anew(self):
+        m = [CustomType(1)]
+        with pipe(codec='session') as (r, w):
+            w.put(m)
+            assert r.get() == m
+            m.append(CustomType(2))
+            m[0].value = 3
+            w.put(m)
+            assert r.get() == m
+
+    def test_failed_message_does_not_corrupt_state(self):
+        with pipe(codec='session') as (r, w):
+            with raises(Exception):
+                w.put([CustomType(1), "newkey", lambda: None])
+            m = [CustomType(2), "newkey"]
+            w.put(m)
+            assert r.get() == m
+
+    def test_across_processes(self):
+        m = [CustomType("a"), {"b": CustomType("c")}]
+        with pipe(codec='session') as (r, w):
+            p = start_process(ipc_readchild_n, args=(r, m, 3))
+            for _ in range(3):
+                w.put(m)
+            p.join()
+            assert p.exitcode == 0
+
+
+class TestRecordCodec(object):
+    """Test the struct-based record codec.
+    """
+    FMT = 'dqB?'
+    FIELDS = ('t', 'sensor', 'flags', 'ok')
+    RECORDS = [(1.5, -3, 255, True), (2.5, 2**40, 0, False)]
+
+    def teardown(self):
+        check_for_handles_left_open()
+
+    def test_roundtrip(self):
+        enc, dec = record_codec(self.FMT, self.FIELDS)
+        with pipe(encoder=enc, decoder=dec) as (r, w):
+            w.put(self.RECORDS)
+            batch = r.get()
+        assert len(batch) == 2
+        assert batch[0] == self.RECORDS[0]
+        assert batch[-1] == self.RECORDS[1]
+        assert batch[0:1] == self.RECORDS[:1]
+        assert list(batch) == self.RECORDS
+        assert batch.tolist() == self.RECORDS
+        with raises(IndexError):
+            batch[2]
+
+    def test_columns(self):
+        enc, dec = record_codec(self.FMT, self.FIELDS)
+        batch = dec(enc(self.RECORDS))
+        assert isinstance(batch.column('sensor'), memoryview)
+        assert batch.column('sensor').tolist() == [-3, 2**40]
+        assert batch.columns['t'].tolist() == [1.5, 2.5]
+        with raises(KeyError):
+            batch.column('nope')
+
+    def test_columnar_layout(self):
+        enc, _ = record_codec('ih', ('a', 'b'))
+        data = enc([(1, 2), (3, 4)])
+        assert data == struct.pack('!I', 2) + struct.pack('2i', 1, 3) + \
+            struct.pack('2h', 2, 4)
+
+    def test_empty_batch(self):
+        enc, dec = record_codec(self.FMT, self.FIELDS)
+        batch = dec(enc([]))
+        assert len(batch) == 0
+        assert list(batch) == []
+
+    def test_invalid_schema(self):
+        with raises(GIPCError):
+            record_codec('dq', ('a',))
+        with raises(GIPCError):
+            record_codec('s', ('a',))
+        with raises(GIPCError):
+            record_codec('dd', ('a', 'a'))
+
+    def test_value_out_of_range(self):
+        enc, _ = record_codec('B', ('a',))
+        with raises(struct.error):
+            enc([(256,)])
+
+    def test_across_processes(self):
+        enc, dec = record_codec(self.FMT, self.FIELDS)
+        with pipe(encoder=enc, decoder=dec) as (r, w):
+            p = start_process(recordchild, args=(r, self.RECORDS))
+            w.put(self.RECORDS)
+            p.join()
+            assert p.exitcode == 0
+
+
+def recordchild(r, records):
+    assert r.get().tolist() == records
+
+
+class TestZeroCopy(object):
+    """Test the buffer frame path of pipes created with `zerocopy=True`.
+    """
+    def teardown(self):
+        check_for_handles_left_open()
+
+    def _roundtrip(self, o, **kwargs):
+        with pipe(zerocopy=True, **kwargs) as (r, w):
+            g = gevent.spawn(w.put, o)
+            result = r.get()
+            g.get()
+        return result
+
+    def test_bytearray(self):
+        for size in (0, 10, 1000000):
+            o = bytearray(os.urandom(size))
+            result = self._roundtrip(o)
+            assert type(result) is bytearray
+            assert result == o
+
+    def test_array(self):
+        for o in (array.array('d', [1.5] * 100000), array.array('b'),
+                  array.array('Q', [2**64 - 1, 0])):
+            result = self._roundtrip(o)
+            assert type(result) is array.array
+            assert result.typecode == o.typecode
+            assert result == o
+
+    def test_array_unsupported_typecode_is_encoded(self):
+        o = array.array('u', 'abc')
+        with pipe(zerocopy=True, decoder=None) as (r, w):
+            w.put(o)
+            assert pickle.loads(r.get()) == o
+
+    def test_bypasses_codec(self):
+        o = bytearray(b"abc")
+        with pipe(zerocopy=True, encoder=None, decoder=None) as (r, w):
+            w.put(o)
+            assert r.get() == o
+            w.put(b"xyz")
+            assert r.get() == b"xyz"
+
+    def test_mixed_with_regular_messages(self):
+        messages = [1, bytearray(b"x" * 100000), "foo", array.array('i', [3])]
+        with pipe(zerocopy=True) as (r, w):
+            g = gevent.spawn(lambda: [w.put(m) for m in messages])
+            for m in messages:
+                assert r.get() == m
+            g.get()
+
+    def test_with_compression(self):
+        o = bytearray(b"x" * 100000)
+        assert self._roundtrip(o, compression='zlib') == o
+        assert self._roundtrip("y" * 100000, compression='zlib') == "y" * 100000
+
+    def test_disabled_by_default(self):
+        with pipe(decoder=None) as (r, w):
+            w.put(bytearray(b"abc"))
+            assert pickle.loads(r.get()) == bytearray(b"abc")
+
+    def test_eof_within_buffer(self):
+        r, w = pipe(zerocopy=True)
+        with r:
+            meta = marshal.dumps(('bytearray', None, None, 10), 2)
+            w._write(struct.pack("!i", -len(meta)) + meta + b"12345")
+            w.close()
+            with raises(IOError):
+                r.get()
+
+    def test_across_processes(self):
+        o = array.array('d', range(200000))
+        with pipe(zerocopy=True) as (r, w):
+            p = start_process(ipc_readchild, args=(r, o))
+            w.put(o)
+            p.join()
+            assert p.exitcode == 0
+
+
+@mark.skipif('not NUMPY_AVAILABLE')
+class TestZeroCopyNumpy(object):
+    """Test the buffer frame path with NumPy arrays.
+    """
+    def teardown(self):
+        check_for_handles_left_open()
+
+    def _roundtrip(self, o):
+        with pipe(zerocopy=True) as (r, w):
+            g = gevent.spawn(w.put, o)
+            result = r.get()
+            g.get()
+        return result
+
+    def test_dtypes_and_shapes(self):
+        import numpy as np
+        arrays = [
+            np.arange(1000000, dtype=np.float64).reshape(1000, 1000),
+            np.array(3.5),
+            np.zeros((0, 3), dtype=np.int8),
+            np.arange(10, dtype='>u4'),
+            np.array(['2020-01-01'], dtype='datetime64[ns]'),
+            np.array([1 + 2j], dtype=np.complex64),
+            ]
+        for a in arrays:
+            result = self._roundtrip(a)
+            assert type(result) is np.ndarray
+            assert result.dtype == a.dtype
+            assert result.shape == a.shape
+            assert (result == a).all()
+
+    def test_non_contiguous(self):
+        import numpy as np
+        a = np.arange(100).reshape(10, 10)[::2, ::3].T
+        result = self._roundtrip(a)
+        assert result.flags.c_contiguous
+        assert (result == a).all()
+
+    def test_object_and_structured_dtype_are_encoded(self):
+        import numpy as np
+        for a in (np.array([1, "a"], dtype=object),
+                  np.zeros(3, dtype=[('x', 'i4'), ('y', 'f8')])):
+            with pipe(zerocopy=True, decoder=None) as (r, w):
+                w.put(a)
+                assert (pickle.loads(r.get()) == a).all()
+
+
+class TestRawRelay(object):
+    """Test `get_raw()`, `put_raw()`, and `relay()`.
+    """
+    def teardown(self):
+        check_for_handles_left_open()
+
+    def test_get_raw_put_raw(self):
+        with pipe() as (r, w):
+            w.put({"a": 1})
+            raw = r.get_raw()
+            assert raw == pickle.dumps({"a": 1}, pickle.HIGHEST_PROTOCOL)
+            w.put_raw(raw)
+            assert r.get() == {"a": 1}
+
+    def test_get_raw_decompresses(self):
+        m = "x" * 10000
+        with pipe(compression='zlib') as (r, w):
+            w.put(m)
+            assert pickle.loads(r.get_raw()) == m
+            w.put_raw(pickle.dumps(m))
+            assert r.get() == m
+
+    def test_get_raw_buffer_frame(self):
+        with pipe(zerocopy=True) as (r, w):
+            w.put(bytearray(b"abc"))
+            w.put("next")
+            with raises(GIPCError):
+                r.get_raw()
+            assert r.get() == "next"
+
+    def test_duplex(self):
+        with pipe(duplex=True) as (h1, h2):
+            h1.put_raw(pickle.dumps(1))
+            assert h2.get_raw() == pickle.dumps(1)
+
+    def _relay(self, messages, src_kwargs={}, dst_kwargs={}):
+        with pipe(**src_kwargs) as (r1, w1):
+            with pipe(**dst_kwargs) as (r2, w2):
+                g = gevent.spawn(relay, r1, w2, len(messages))
+                gw = gevent.spawn(lambda: [w1.put(m) for m in messages])
+                for m in messages:
+                    assert r2.get() == m
+                assert g.get() == len(messages)
+                gw.get()
+
+    def test_relay(self):
+        self._relay(["a", 1, None, "x" * 1000000, "b"])
+
+    def test_relay_does_not_decode(self):
+        def fail(b):
+            raise Exception("decoder invoked")
+        m = "x" * 1000000
+        with pipe(decoder=fail) as (r1, w1):
+            with pipe(encoder=fail) as (r2, w2):
+                gw = gevent.spawn(w1.put, m)
+                g = gevent.spawn(relay, r1, w2, 1)
+                assert r2.get() == m
+                g.get()
+                gw.get()
+
+    def test_relay_without_splice(self, monkeypatch):
+        monkeypatch.setattr(gipc.gipc, "_splice_nonblocking", None)
+        self._relay(["a", "x" * 1000000])
+
+    def test_relay_compression(self):
+        messages = ["a", "x" * 100000, "b"]
+        zlib = {'compression': 'zlib'}
+        self._relay(messages, zlib, {})
+        self._relay(messages, {}, zlib)
+        self._relay(messages, zlib, {'compression': 'lzma'})
+
+    def test_relay_buffer_frames(self):
+        messages = [bytearray(b"x" * 1000000), bytearray(b"y"), "z"]
+        zc = {'zerocopy': True}
+        self._relay(messages, zc, {})
+        self._relay(messages, zc, {'compression': 'zlib'})
+        self._relay(messages, dict(zc, compression='zlib'), {})
+
+    def test_relay_until_eof(self):
+        with pipe() as (r2, w2):
+            r1, w1 = pipe()
+            with r1:
+                with w1:
+                    for i in range(10):
+                        w1.put(i)
+                assert relay(r1, w2) == 10
+            for i in range(10):
+                assert r2.get() == i
+
+    def test_relay_eof_before_count(self):
+        with pipe() as (r2, w2):
+            r1, w1 = pipe()
+            with r1:
+                with w1:
+                    w1.put(1)
+                with raises(EOFError):
+                    relay(r1, w2, 2)
+
+    @mark.skipif('WINDOWS')
+    def test_relay_shm(self):
+        messages = ["a", "x" * 100000]
+        with shm_pipe() as (r1, w1):
+            with pipe() as (r2, w2):
+                for m in messages:
+                    w1.put(m)
+                assert relay(r1, w2, 2) == 2
+                for m in messages:
+                    assert r2.get() == m
+
+    def test_relay_broker_process(self):
+        messages = ["a", "x" * 1000000, {"b": 1}]
+        with pipe() as (r1, w1):
+            with pipe() as (r2, w2):
+                p = start_process(relaychild, args=(r1, w2))
+                for m in messages:
+                    w1.put(m)
+                for m in messages:
+                    assert r2.get() == m
+                w1.close()
+                p.join()
+                assert p.exitcode == 0
+
+
+def relaychild(r, w):
+    assert relay(r, w) == 3
+
+
+def ipc_readchild_n(r, m, n):
+    for _ in range(n):
+        assert r.get() == m
+
+
+def _module_available(name):
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+ZSTD_AVAILABLE = _module_available('zstandard') or _module_available(
+    'compression.zstd')
+LZ4_AVAILABLE = _module_available('lz4.frame')
+NUMPY_AVAILABLE = _module_available('numpy')
+
+
+class TestPipeCompression(object):
+    """Test payload compression, with the per-message compression tag.
+    """
+    def teardown(self):
+        check_for_handles_left_open()
+
+    @staticmethod
+    def _roundtrip(data, **kwargs):
+        with pipe(**kwargs) as (r, w):
+            gw = gevent.spawn(lambda: w.put(data))
+            result = r.get()
+            gw.get()
+        return result
+
+    def test_zlib(self):
+        data = {"key": "value" * 10000}
+        assert data == self._roundtrip(data, compression='zlib')
+
+    def test_lzma(self):
+        data = ["value"] * 10000
+        assert data == self._roundtrip(data, compression='lzma', compression_level=1)
+
+    @mark.skipif('not ZSTD_AVAILABLE')
+    def test_zstd(self):
+        data = b"A" * 100000
+        assert data == self._roundtrip(data, compression='zstd')
+
+    @mark.skipif('not LZ4_AVAILABLE')
+    def test_lz4(self):
+        data = b"A" * 100000
+        assert data == self._roundtrip(data, compression='lz4')
+
+    def test_raw_and_compressed(self):
+        data = b"A" * 100000
+        assert data == self._roundtrip(
+            data, encoder=None, decoder=None, compression='zlib')
+
+    def test_small_message_not_compressed(self):
+        with pipe(encoder=None, compression='zlib') as (r, w):
+            w.put(b"A" * 100)
+            frame = os.read(r._fd, 1000)
+        # Length header, tag 0 (uncompressed), payload.
+        assert frame == struct.pack("!iB", 101, 0) + b"A" * 100
+
+    def test_large_message_compressed(self):
+        with pipe(encoder=None, compression='zlib') as (r, w):
+            w.put(b"A" * 10000)
+            frame = os.read(r._fd, 20000)
+        msize, tag = struct.unpack("!iB", frame[:5])
+        assert tag != 0
+        assert msize == len(frame) - 4
+        assert msize < 10000
+
+    def test_incompressible_message_sent_uncompressed(self):
+        data = os.urandom(10000)
+        with pipe(encoder=None, compression='zlib') as (r, w):
+            w.put(data)
+            frame = r._recv_in_buffer(5).getvalue()
+            assert struct.unpack("!iB", frame) == (10001, 0)
+            assert r._recv_in_buffer(10000).getvalue() == data
+
+    def test_threshold(self):
+        with pipe(encoder=None, compression='zlib',
+                  compression_threshold=0) as (r, w):
+            w.put(b"A" * 100)
+            frame = os.read(r._fd, 1000)
+        assert struct.unpack("!iB", frame[:5])[1] != 0
+
+    def test_reader_detects_method(self):
+        # The tag identifies the method, the reader does not need to know it.
+        r, w = pipe(compression='lzma')
+        r._compressed = True
+        with r:
+            with w:
+                w.put("A" * 10000)
+                assert r.get() == "A" * 10000
+
+    def test_unknown_method(self):
+        with raises(GIPCError):
+            pipe(compression='foo')
+
+    def test_across_processes(self):
+        m = ["x" * 100] * 1000
+        with pipe(compression='zlib') as (r, w):
+            p = start_process(ipc_readchild, args=(r, m))
+            w.put(m)
+            p.join()
+            assert p.exitcode == 0
+
+
 class TestSimpleUseCases(object):
     """Test very basic usage scenarios of gipc (pure gipc+gevent).
     """
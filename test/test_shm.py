@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012-2021 Dr. Jan-Philip Gehrcke. See LICENSE file for details.
+
+
+"""
+Tests for the shared memory-based transport (`gipc.shm`).
+"""
+
+
+import os
+import sys
+import pickle
+import random
+
+import gevent
+
+sys.path.insert(0, os.path.abspath('..'))
+from gipc import start_process, pipe, shm_pipe, SharedStore
+from gipc import GIPCError, GIPCClosed
+from gipc.gipc import _get_all_handles as get_all_handles
+
+from pytest import raises, mark
+
+from test_gipc import check_for_handles_left_open, _module_available
+
+
+WINDOWS = sys.platform == "win32"
+SHORTTIME = 0.01
+NUMPY_AVAILABLE = _module_available('numpy')
+
+
+@mark.skipif('WINDOWS')
+class TestShmPipe(object):
+    """Test basic communication through `shm_pipe()` handles.
+    """
+    def setup(self):
+        self.rh, self.wh = shm_pipe(size=4096)
+
+    def teardown(self):
+        self.rh.close()
+        self.wh.close()
+        check_for_handles_left_open()
+
+    def test_singlemsg(self):
+        m = [1, "OK", None]
+        self.wh.put(m)
+        assert self.rh.get() == m
+
+    def test_handles_registered(self):
+        handles = get_all_handles()
+        assert self.rh in handles
+        assert self.wh in handles
+
+    def test_wraparound_various_sizes(self):
+        messages = [b"x" * random.randint(0, 1000) for _ in range(1000)]
+        self.rh._decoder = self.wh._encoder = lambda b: b
+
+        def gwrite():
+            for m in messages:
+                self.wh.put(m)
+
+        g = gevent.spawn(gwrite)
+        for m in messages:
+            assert self.rh.get() == m
+        g.get()
+
+    def test_put_blocks_while_full(self):
+        m = b"x" * 3000
+        self.rh._decoder = self.wh._encoder = lambda b: b
+        self.wh.put(m)
+        g = gevent.spawn(self.wh.put, m)
+        gevent.sleep(SHORTTIME)
+        assert not g.ready()
+        assert self.rh.get() == m
+        g.get()
+        assert self.rh.get() == m
+
+    def test_message_too_large(self):
+        with raises(GIPCError):
+            self.wh.put("x" * 5000)
+        # The channel remains usable.
+        self.wh.put("y")
+        assert self.rh.get() == "y"
+
+    def test_get_blocks_until_put(self):
+        g = gevent.spawn(self.rh.get)
+        gevent.sleep(SHORTTIME)
+        assert not g.ready()
+        self.wh.put("foo")
+        assert g.get() == "foo"
+
+    def test_timeout(self):
+        with raises(gevent.Timeout):
+            with gevent.Timeout(SHORTTIME) as t:
+                self.rh.get(timeout=t)
+
+    def test_closed(self):
+        self.wh.close()
+        with raises(GIPCClosed):
+            self.wh.put("foo")
+        # Re-create for teardown.
+        self.rh.close()
+        self.rh, self.wh = shm_pipe()
+
+    def test_eof(self):
+        self.wh.put("last")
+        self.wh.close()
+        assert self.rh.get() == "last"
+        with raises(EOFError):
+            self.rh.get()
+        self.rh.close()
+        self.rh, self.wh = shm_pipe()
+
+
+@mark.skipif('WINDOWS')
+class TestShmPipeConfig(object):
+    def teardown(self):
+        check_for_handles_left_open()
+
+    def test_codec(self):
+        with shm_pipe(codec='marshal') as (r, w):
+            w.put({"a": [1, 2.0]})
+            assert r.get() == {"a": [1, 2.0]}
+
+    def test_raw(self):
+        with shm_pipe(encoder=None, decoder=None) as (r, w):
+            w.put(b"raw")
+            assert r.get() == b"raw"
+
+    def test_invalid_size(self):
+        with raises(GIPCError):
+            shm_pipe(size=0)
+
+    def test_invalid_codec(self):
+        with raises(GIPCError):
+            shm_pipe(codec='not-registered')
+
+
+@mark.skipif('WINDOWS')
+class TestShmPipeIPC(object):
+    """Test transfer of `shm_pipe()` handles to child processes.
+    """
+    def teardown(self):
+        check_for_handles_left_open()
+
+    def test_read_in_child(self):
+        n = 20000
+        with shm_pipe(size=1024) as (r, w):
+            p = start_process(shm_readchild, args=(r, n))
+            for i in range(n):
+                w.put(i)
+            p.join()
+            assert p.exitcode == 0
+
+    def test_write_in_child(self):
+        n = 20000
+        with shm_pipe(size=1024) as (r, w):
+            p = start_process(shm_writechild, args=(w, n))
+            for i in range(n):
+                assert r.get() == i
+            with raises(EOFError):
+                r.get()
+            p.join()
+            assert p.exitcode == 0
+
+    def test_echo(self):
+        with shm_pipe() as (r1, w1):
+            with shm_pipe() as (r2, w2):
+                p = start_process(shm_echochild, args=(r1, w2, 100))
+                for i in range(100):
+                    w1.put(i)
+                    assert r2.get() == i
+                p.join()
+                assert p.exitcode == 0
+
+
+def shm_readchild(r, n):
+    for i in range(n):
+        assert r.get() == i
+
+
+def shm_writechild(w, n):
+    for i in range(n):
+        w.put(i)
+
+
+def shm_echochild(r, w, n):
+    for _ in range(n):
+        w.put(r.get())
+
+
+@mark.skipif('WINDOWS')
+class TestSharedStore(object):
+    """Test `SharedStore` within a single process and across processes.
+    """
+    def setup(self):
+        self.store = SharedStore(size=4096, max_entries=4)
+
+    def teardown(self):
+        self.store.close()
+        check_for_handles_left_open()
+
+    def test_put_get(self):
+        o = {"a": [1, 2, 3]}
+        ref = self.store.put(o)
+        assert self.store.get(ref) is o
+        assert self.store.refcount(ref) == 1
+
+    def test_ref_is_small(self):
+        ref = self.store.put("x" * 1000)
+        assert len(pickle.dumps(ref)) < 100
+
+    def test_release_and_evict(self):
+        ref1 = self.store.put(b"x" * 2000)
+        ref2 = self.store.put(b"y" * 1000)
+        # No space left for another large object, all entries referenced.
+        with raises(GIPCError):
+            self.store.put(b"z" * 2000)
+        self.store.release(ref1)
+        assert self.store.refcount(ref1) == 0
+        ref3 = self.store.put(b"z" * 2000)
+        # `ref1` has been evicted to make room for `ref3`.
+        with raises(KeyError):
+            self.store.get(ref1)
+        assert self.store.get(ref2) == b"y" * 1000
+        assert self.store.get(ref3) == b"z" * 2000
+
+    def test_unreferenced_entry_remains_available(self):
+        ref = self.store.put([1])
+        self.store.release(ref)
+        assert self.store.refcount(ref) == 0
+        # Decoded from shared memory (the original object was dropped).
+        assert self.store.get(ref) == [1]
+        assert self.store.refcount(ref) == 1
+
+    def test_max_entries(self):
+        refs = [self.store.put(i) for i in range(4)]
+        with raises(GIPCError):
+            self.store.put(4)
+        self.store.release(refs[2])
+        self.store.put(4)
+
+    def test_too_large(self):
+        with raises(GIPCError):
+            self.store.put(b"x" * 5000)
+
+    def test_closed(self):
+        self.store.close()
+        with raises(GIPCError):
+            self.store.put(1)
+        self.store = SharedStore()
+
+    def test_get_in_children(self):
+        o = {"key": list(range(100))}
+        ref = self.store.put(o)
+        for _ in range(3):
+            with pipe() as (r, w):
+                p = start_process(store_getchild, args=(self.store, ref, w))
+                assert r.get() == (o, 2)
+                p.join()
+                assert p.exitcode == 0
+        # Children released their references upon closing the store.
+        assert self.store.refcount(ref) == 1
+
+    def test_put_in_child_fails(self):
+        with pipe() as (r, w):
+            p = start_process(store_putchild, args=(self.store, w))
+            assert r.get() == "GIPCError"
+            p.join()
+
+    @mark.skipif('not NUMPY_AVAILABLE')
+    def test_numpy_array_is_not_copied(self):
+        import numpy as np
+        self.store.close()
+        self.store = SharedStore(size=2**20)
+        a = np.arange(10000, dtype=np.float64)
+        ref = self.store.put(a)
+        self.store.release(ref)
+        b = self.store.get(ref)
+        assert (a == b).all()
+        assert not b.flags.writeable
+        # The array data lives in the shared memory segment.
+        assert not b.flags.owndata
+        del b
+        self.store.release(ref)
+
+
+def store_getchild(store, ref, w):
+    o = store.get(ref)
+    w.put((o, store.refcount(ref)))
+    store.close()
+
+
+def store_putchild(store, w):
+    try:
+        store.put(1)
+    except GIPCError:
+        w.put("GIPCError")